@@ -1,33 +1,105 @@
 from __future__ import annotations
 
 import argparse
-import csv
 import hashlib
 import json
+import multiprocessing
 import os
 import shutil
 import subprocess
 import sys
-from dataclasses import dataclass
+import tempfile
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Any, Optional
+from itertools import islice
+from operator import itemgetter
+from typing import Any, BinaryIO, Iterator, Optional
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON encoding when installed
+    orjson = None  # type: ignore[assignment]
 
 
 SCHEMA_VERSION = 1
 
+# Sessions/timeline events encoded per call when streaming the artifact.
+_STREAM_BATCH = 1024
+
+# Packets per editcap shard when decoding with --jobs > 1.
+_SHARD_PACKETS = 200_000
+
+_TSHARK_FIELDS = [
+    "frame.number",
+    "frame.time_epoch",
+    "frame.len",
+    "ip.src",
+    "ip.dst",
+    "ipv6.src",
+    "ipv6.dst",
+    "tcp.srcport",
+    "tcp.dstport",
+    "udp.srcport",
+    "udp.dstport",
+    "frame.protocols",
+    "dns.qry.name",
+    "http.request.method",
+    "http.host",
+    "http.request.uri",
+    "tls.handshake.extensions_server_name",
+]
+
 
 def _utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
 def _sha256_file(path: str) -> str:
-    digest = hashlib.sha256()
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: f.read(4 * 1024 * 1024), b""):
             digest.update(chunk)
     return digest.hexdigest()
 
 
+def _encode_json(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, sort_keys=False).encode("utf-8")
+
+
+def _write_artifact(f: BinaryIO, artifact: dict[str, Any]) -> None:
+    # Emits the same layout as _encode_json(artifact), but iterator values
+    # are streamed as JSON arrays, _STREAM_BATCH elements at a time. Each
+    # batch is encoded with a single encoder call and its brackets trimmed,
+    # so consecutive batches join into one array.
+    sep = b"{\n  "
+    for key, value in artifact.items():
+        f.write(sep)
+        sep = b",\n  "
+        f.write(_encode_json(key))
+        f.write(b": ")
+        if isinstance(value, Iterator):
+            opener = b"["
+            while True:
+                batch = list(islice(value, _STREAM_BATCH))
+                if not batch:
+                    break
+                encoded = _encode_json(batch).replace(b"\n", b"\n  ")
+                f.write(opener)
+                f.write(encoded[1:-4])  # drop "[" and the trailing "\n  ]"
+                opener = b","
+            f.write(b"[]" if opener == b"[" else b"\n  ]")
+        else:
+            f.write(_encode_json(value).replace(b"\n", b"\n  "))
+    f.write(b"\n}\n")
+
+
 def _resolve_tshark(explicit_path: Optional[str]) -> str:
     if explicit_path:
         return explicit_path
@@ -42,6 +114,23 @@ def _resolve_tshark(explicit_path: Optional[str]) -> str:
     return resolved
 
 
+def _resolve_editcap(tshark_bin: str) -> str:
+    # editcap ships with tshark, so prefer the copy next to the resolved binary.
+    tshark_dir = os.path.dirname(tshark_bin)
+    if tshark_dir:
+        for name in ("editcap", "editcap.exe"):
+            candidate = os.path.join(tshark_dir, name)
+            if os.path.isfile(candidate):
+                return candidate
+    resolved = shutil.which("editcap")
+    if not resolved:
+        raise FileNotFoundError(
+            "editcap not found next to tshark or on PATH. Install Wireshark/tshark "
+            "or run with --jobs 1."
+        )
+    return resolved
+
+
 def _tshark_version(tshark_path: str) -> Optional[str]:
     try:
         proc = subprocess.run(
@@ -57,30 +146,6 @@ def _tshark_version(tshark_path: str) -> Optional[str]:
         return None
 
 
-def _safe_int(value: Optional[str]) -> Optional[int]:
-    if value is None:
-        return None
-    value = value.strip()
-    if value == "":
-        return None
-    try:
-        return int(value)
-    except ValueError:
-        return None
-
-
-def _safe_float(value: Optional[str]) -> Optional[float]:
-    if value is None:
-        return None
-    value = value.strip()
-    if value == "":
-        return None
-    try:
-        return float(value)
-    except ValueError:
-        return None
-
-
 def _canonical_endpoint(
     ip: str, port: Optional[int]
 ) -> tuple[str, int]:
@@ -92,62 +157,105 @@ def _canonical_pair(
     src_port: Optional[int],
     dst_ip: str,
     dst_port: Optional[int],
-) -> tuple[dict[str, Any], dict[str, Any]]:
+) -> tuple[str, Optional[int], str, Optional[int]]:
     a = _canonical_endpoint(src_ip, src_port)
     b = _canonical_endpoint(dst_ip, dst_port)
     if a <= b:
-        return (
-            {"ip": src_ip, "port": src_port},
-            {"ip": dst_ip, "port": dst_port},
-        )
-    return (
-        {"ip": dst_ip, "port": dst_port},
-        {"ip": src_ip, "port": src_port},
-    )
+        return src_ip, src_port, dst_ip, dst_port
+    return dst_ip, dst_port, src_ip, src_port
 
 
-@dataclass
-class TimelineEvent:
-    ts: float
-    session_id: str
-    kind: str
-    summary: str
-    evidence_frame: int
+def _session_id(session_key: tuple[Any, ...]) -> str:
+    transport, a_ip, a_port, b_ip, b_port = session_key
+    encoded = f"{transport}:{a_ip}:{a_port}->{b_ip}:{b_port}".encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=6).hexdigest()
 
 
-def analyze_pcap(
+@dataclass
+class _SessionTable:
+    # Per-session state is kept as parallel arrays (struct-of-arrays) indexed
+    # by a small integer session index; the nested JSON shape is only built
+    # once, after the capture has been consumed. Tables from separate shards
+    # are combined with _merge_tables.
+    packet_count: int = 0
+    first_ts: Optional[float] = None
+    last_ts: Optional[float] = None
+    session_index: dict[tuple[Any, ...], int] = field(default_factory=dict)
+    session_ids: list[str] = field(default_factory=list)
+    transports: list[str] = field(default_factory=list)
+    endpoints_a: list[dict[str, Any]] = field(default_factory=list)
+    endpoints_b: list[dict[str, Any]] = field(default_factory=list)
+    # Hot numeric accumulators are typed arrays rather than lists of boxed
+    # floats/ints, which keeps them compact on captures with many flows.
+    first_ts_arr: array[float] = field(default_factory=lambda: array("d"))
+    last_ts_arr: array[float] = field(default_factory=lambda: array("d"))
+    pkt_cnt: array[int] = field(default_factory=lambda: array("q"))
+    byte_cnt: array[int] = field(default_factory=lambda: array("q"))
+    first_fr: array[int] = field(default_factory=lambda: array("q"))
+    last_fr: array[int] = field(default_factory=lambda: array("q"))
+    sample_frames: list[list[int]] = field(default_factory=list)
+    # Protocol chains are numbered per table (there are only a few dozen
+    # distinct ones); each session counts them in an array indexed by id.
+    chain_names: list[str] = field(default_factory=list)
+    chain_counts: list[array[int]] = field(default_factory=list)
+    dns_obs: list[list[dict[str, Any]]] = field(default_factory=list)
+    http_obs: list[list[dict[str, Any]]] = field(default_factory=list)
+    sni_obs: list[list[dict[str, Any]]] = field(default_factory=list)
+    # Observations seen per session and kind, including any dropped once the
+    # per-kind list reached max_observations_per_kind.
+    dns_total: array[int] = field(default_factory=lambda: array("q"))
+    http_total: array[int] = field(default_factory=lambda: array("q"))
+    sni_total: array[int] = field(default_factory=lambda: array("q"))
+    # Timeline events as (ts, evidence_frame, kind, session_id, summary).
+    # Plain tuple ordering matches capture order: ties on ts fall back to the
+    # frame number, and the kinds emitted for one frame sort in the order
+    # they are appended (dns_query, http_request, tls_sni).
+    events: list[tuple[float, int, str, str, str]] = field(default_factory=list)
+
+    def _new_session(
+        self,
+        session_key: tuple[Any, ...],
+        session_id: str,
+        transport: str,
+        endpoint_a: dict[str, Any],
+        endpoint_b: dict[str, Any],
+        ts: float,
+        frame_no: int,
+    ) -> int:
+        # Append one empty session to every parallel array and return its
+        # index. Counters start at zero; the caller accumulates the packet.
+        sid = len(self.session_ids)
+        self.session_index[session_key] = sid
+        self.session_ids.append(session_id)
+        self.transports.append(transport)
+        self.endpoints_a.append(endpoint_a)
+        self.endpoints_b.append(endpoint_b)
+        self.first_ts_arr.append(ts)
+        self.last_ts_arr.append(ts)
+        self.pkt_cnt.append(0)
+        self.byte_cnt.append(0)
+        self.first_fr.append(frame_no)
+        self.last_fr.append(frame_no)
+        self.sample_frames.append([])
+        self.chain_counts.append(array("Q"))
+        self.dns_obs.append([])
+        self.http_obs.append([])
+        self.sni_obs.append([])
+        self.dns_total.append(0)
+        self.http_total.append(0)
+        self.sni_total.append(0)
+        return sid
+
+
+def _scan_capture(
+    tshark_bin: str,
     pcap_path: str,
     *,
-    tshark_path: Optional[str],
     max_packets: Optional[int],
     sample_frames_per_session: int,
-    include_sha256: bool,
-) -> dict[str, Any]:
-    if not os.path.isfile(pcap_path):
-        raise FileNotFoundError(f"PCAP not found: {pcap_path}")
-
-    tshark_bin = _resolve_tshark(tshark_path)
-
-    fields = [
-        "frame.number",
-        "frame.time_epoch",
-        "frame.len",
-        "ip.src",
-        "ip.dst",
-        "ipv6.src",
-        "ipv6.dst",
-        "tcp.srcport",
-        "tcp.dstport",
-        "udp.srcport",
-        "udp.dstport",
-        "frame.protocols",
-        "dns.qry.name",
-        "http.request.method",
-        "http.host",
-        "http.request.uri",
-        "tls.handshake.extensions_server_name",
-    ]
-
+    max_observations_per_kind: Optional[int] = None,
+    frame_offset: int = 0,
+) -> _SessionTable:
     cmd: list[str] = [
         tshark_bin,
         "-r",
@@ -159,187 +267,572 @@ def analyze_pcap(
         "header=y",
         "-E",
         "separator=\t",
+        # Field values are escaped by tshark (tabs become `\t`), so unquoted
+        # rows split safely on the separator without any unquoting pass.
         "-E",
-        "quote=d",
+        "quote=n",
         "-E",
         "occurrence=f",
     ]
     if max_packets is not None:
         cmd.extend(["-c", str(max_packets)])
-    for f in fields:
+    for f in _TSHARK_FIELDS:
         cmd.extend(["-e", f])
 
     proc = subprocess.Popen(
         cmd,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        text=True,
-        bufsize=1,
+        bufsize=1 << 20,
     )
     assert proc.stdout is not None
     assert proc.stderr is not None
 
-    sessions: dict[str, dict[str, Any]] = {}
-    events: list[TimelineEvent] = []
+    table = _SessionTable()
+    session_index = table.session_index
+    session_ids = table.session_ids
+    first_ts_arr = table.first_ts_arr
+    last_ts_arr = table.last_ts_arr
+    pkt_cnt = table.pkt_cnt
+    byte_cnt = table.byte_cnt
+    first_fr = table.first_fr
+    last_fr = table.last_fr
+    sample_frames = table.sample_frames
+    chain_names = table.chain_names
+    chain_counts = table.chain_counts
+    dns_obs = table.dns_obs
+    http_obs = table.http_obs
+    sni_obs = table.sni_obs
+    dns_total = table.dns_total
+    http_total = table.http_total
+    sni_total = table.sni_total
+    events = table.events
+    obs_limit = sys.maxsize if max_observations_per_kind is None else max_observations_per_kind
+    # Raw frame.protocols bytes -> index into chain_names.
+    chain_ids: dict[bytes, int] = {}
+
+    header = proc.stdout.readline().decode("utf-8").rstrip().split("\t")
+    idx = {name: i for i, name in enumerate(header)}
+    if any(f not in idx for f in _TSHARK_FIELDS):
+        # tshark writes no header when it cannot read the capture; surface
+        # its own error rather than failing on the missing columns.
+        _, stderr_b = proc.communicate()
+        stderr = stderr_b.decode("utf-8", "replace")
+        raise RuntimeError(f"tshark failed (exit {proc.returncode}): {stderr.strip()}")
+    # One C-level call pulls each group of columns out of a split row.
+    row_fields = itemgetter(
+        *(
+            idx[f]
+            for f in (
+                "frame.number",
+                "frame.time_epoch",
+                "frame.len",
+                "frame.protocols",
+                "dns.qry.name",
+                "http.request.method",
+                "http.host",
+                "http.request.uri",
+                "tls.handshake.extensions_server_name",
+            )
+        )
+    )
+    flow_fields = itemgetter(
+        *(
+            idx[f]
+            for f in (
+                "ip.src",
+                "ip.dst",
+                "ipv6.src",
+                "ipv6.dst",
+                "tcp.srcport",
+                "tcp.dstport",
+                "udp.srcport",
+                "udp.dstport",
+            )
+        )
+    )
 
-    reader = csv.DictReader(proc.stdout, delimiter="\t", quotechar='"')
+    # Raw flow columns -> session index (-1 for packets without an IP pair).
+    # This groups packets on the unparsed column text, so endpoint parsing
+    # and canonicalization run once per distinct flow direction rather than
+    # once per packet.
+    flow_sids: dict[tuple[bytes, ...], int] = {}
 
     packet_count = 0
     first_ts: Optional[float] = None
     last_ts: Optional[float] = None
 
-    for row in reader:
-        packet_count += 1
-
-        frame_no = _safe_int(row.get("frame.number"))
-        ts = _safe_float(row.get("frame.time_epoch"))
-        frame_len = _safe_int(row.get("frame.len"))
-        if frame_no is None or ts is None:
-            continue
-
-        first_ts = ts if first_ts is None else min(first_ts, ts)
-        last_ts = ts if last_ts is None else max(last_ts, ts)
-
-        src_ip = (row.get("ip.src") or row.get("ipv6.src") or "").strip()
-        dst_ip = (row.get("ip.dst") or row.get("ipv6.dst") or "").strip()
-        if not src_ip or not dst_ip:
-            continue
-
-        tcp_src = _safe_int(row.get("tcp.srcport"))
-        tcp_dst = _safe_int(row.get("tcp.dstport"))
-        udp_src = _safe_int(row.get("udp.srcport"))
-        udp_dst = _safe_int(row.get("udp.dstport"))
-
-        transport: str
-        src_port: Optional[int]
-        dst_port: Optional[int]
-        if tcp_src is not None or tcp_dst is not None:
-            transport = "tcp"
-            src_port, dst_port = tcp_src, tcp_dst
-        elif udp_src is not None or udp_dst is not None:
-            transport = "udp"
-            src_port, dst_port = udp_src, udp_dst
-        else:
-            transport = "other"
-            src_port, dst_port = None, None
-
-        a, b = _canonical_pair(src_ip, src_port, dst_ip, dst_port)
-        session_key = f"{transport}:{a['ip']}:{a['port']}->{b['ip']}:{b['port']}"
-        session_id = hashlib.sha1(session_key.encode("utf-8")).hexdigest()[:12]
-
-        session = sessions.get(session_key)
-        if session is None:
-            session = {
-                "id": session_id,
-                "transport": transport,
-                "endpoints": {"a": a, "b": b},
-                "first_ts": ts,
-                "last_ts": ts,
-                "packet_count": 0,
-                "byte_count": 0,
-                "protocol_chains": {},
-                "evidence": {
-                    "first_frame": frame_no,
-                    "last_frame": frame_no,
-                    "sample_frames": [],
-                },
-                "observations": {
-                    "dns_queries": [],
-                    "http_requests": [],
-                    "tls_sni": [],
-                },
-                "rule_flags": [],
-            }
-            sessions[session_key] = session
-
-        session["packet_count"] += 1
-        session["byte_count"] += 0 if frame_len is None else frame_len
-        session["first_ts"] = min(session["first_ts"], ts)
-        session["last_ts"] = max(session["last_ts"], ts)
-        session["evidence"]["first_frame"] = min(session["evidence"]["first_frame"], frame_no)
-        session["evidence"]["last_frame"] = max(session["evidence"]["last_frame"], frame_no)
-        if len(session["evidence"]["sample_frames"]) < sample_frames_per_session:
-            session["evidence"]["sample_frames"].append(frame_no)
-
-        chain = (row.get("frame.protocols") or "").strip()
-        if chain:
-            session["protocol_chains"][chain] = session["protocol_chains"].get(chain, 0) + 1
-
-        dns_qry = (row.get("dns.qry.name") or "").strip()
-        if dns_qry:
-            session["observations"]["dns_queries"].append(
-                {"name": dns_qry, "ts": ts, "evidence_frame": frame_no}
-            )
-            events.append(
-                TimelineEvent(
-                    ts=ts,
-                    session_id=session_id,
-                    kind="dns_query",
-                    summary=f"DNS query: {dns_qry}",
-                    evidence_frame=frame_no,
+    # Bind hot callables to locals so the loop body resolves them with
+    # LOAD_FAST rather than global/attribute lookups.
+    n_fields = len(header)
+    canonical_pair = _canonical_pair
+    new_session = table._new_session
+    session_index_get = session_index.get
+    flow_sids_get = flow_sids.get
+    events_append = events.append
+    chain_ids_get = chain_ids.get
+    # DNS names, HTTP methods/hosts and SNIs repeat heavily across packets;
+    # interning keeps one shared object per distinct value.
+    intern = sys.intern
+    read = proc.stdout.read
+    pending = b""
+
+    while True:
+        chunk = read(1 << 20)
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop() if chunk else b""
+        for line in lines:
+            parts = line.split(b"\t")
+            if len(parts) < n_fields:
+                continue
+
+            packet_count += 1
+
+            (
+                frame_no_raw,
+                ts_raw,
+                frame_len_raw,
+                protocols,
+                dns_qry_name,
+                http_request_method,
+                http_host_raw,
+                http_request_uri,
+                tls_server_name,
+            ) = row_fields(parts)
+
+            try:
+                frame_no = int(frame_no_raw) + frame_offset
+                ts = float(ts_raw)
+                frame_len = int(frame_len_raw) if frame_len_raw else 0
+            except ValueError:
+                print(f"warning: skipping malformed tshark row: {line!r}", file=sys.stderr)
+                continue
+
+            if first_ts is None or ts < first_ts:
+                first_ts = ts
+            if last_ts is None or ts > last_ts:
+                last_ts = ts
+
+            flow = flow_fields(parts)
+            sid = flow_sids_get(flow)
+            if sid is None:
+                (
+                    ip_src,
+                    ip_dst,
+                    ipv6_src,
+                    ipv6_dst,
+                    tcp_srcport,
+                    tcp_dstport,
+                    udp_srcport,
+                    udp_dstport,
+                ) = flow
+                src_ip = (ip_src or ipv6_src).strip().decode("utf-8")
+                dst_ip = (ip_dst or ipv6_dst).strip().decode("utf-8")
+                if not src_ip or not dst_ip:
+                    flow_sids[flow] = -1
+                    continue
+
+                try:
+                    tcp_src = int(tcp_srcport) if tcp_srcport else None
+                    tcp_dst = int(tcp_dstport) if tcp_dstport else None
+                    udp_src = int(udp_srcport) if udp_srcport else None
+                    udp_dst = int(udp_dstport) if udp_dstport else None
+                except ValueError:
+                    print(f"warning: skipping malformed tshark row: {line!r}", file=sys.stderr)
+                    continue
+
+                transport: str
+                src_port: Optional[int]
+                dst_port: Optional[int]
+                if tcp_src is not None or tcp_dst is not None:
+                    transport = "tcp"
+                    src_port, dst_port = tcp_src, tcp_dst
+                elif udp_src is not None or udp_dst is not None:
+                    transport = "udp"
+                    src_port, dst_port = udp_src, udp_dst
+                else:
+                    transport = "other"
+                    src_port, dst_port = None, None
+
+                a_ip, a_port, b_ip, b_port = canonical_pair(src_ip, src_port, dst_ip, dst_port)
+                session_key = (transport, a_ip, a_port, b_ip, b_port)
+
+                sid = session_index_get(session_key)
+                if sid is None:
+                    sid = new_session(
+                        session_key,
+                        _session_id(session_key),
+                        transport,
+                        {"ip": a_ip, "port": a_port},
+                        {"ip": b_ip, "port": b_port},
+                        ts,
+                        frame_no,
+                    )
+                flow_sids[flow] = sid
+            elif sid < 0:
+                continue
+
+            pkt_cnt[sid] += 1
+            byte_cnt[sid] += frame_len
+            if ts < first_ts_arr[sid]:
+                first_ts_arr[sid] = ts
+            if ts > last_ts_arr[sid]:
+                last_ts_arr[sid] = ts
+            if frame_no < first_fr[sid]:
+                first_fr[sid] = frame_no
+            if frame_no > last_fr[sid]:
+                last_fr[sid] = frame_no
+            samples = sample_frames[sid]
+            if len(samples) < sample_frames_per_session:
+                samples.append(frame_no)
+
+            chain = protocols.strip()
+            if chain:
+                cid = chain_ids_get(chain)
+                if cid is None:
+                    cid = chain_ids[chain] = len(chain_names)
+                    chain_names.append(chain.decode("utf-8", "replace"))
+                counts = chain_counts[sid]
+                if cid >= len(counts):
+                    counts.extend([0] * (cid + 1 - len(counts)))
+                counts[cid] += 1
+
+            dns_qry = dns_qry_name.strip()
+            if dns_qry:
+                dns_name = intern(dns_qry.decode("utf-8", "replace"))
+                dns_total[sid] += 1
+                session_obs = dns_obs[sid]
+                if len(session_obs) < obs_limit:
+                    session_obs.append({"name": dns_name, "ts": ts, "evidence_frame": frame_no})
+                events_append(
+                    (ts, frame_no, "dns_query", session_ids[sid], f"DNS query: {dns_name}")
                 )
-            )
 
-        http_method = (row.get("http.request.method") or "").strip()
-        http_host = (row.get("http.host") or "").strip()
-        http_uri = (row.get("http.request.uri") or "").strip()
-        if http_method and (http_host or http_uri):
-            summary = f"HTTP request: {http_method} {http_host}{http_uri}"
-            session["observations"]["http_requests"].append(
-                {
-                    "method": http_method,
-                    "host": http_host or None,
-                    "uri": http_uri or None,
-                    "ts": ts,
-                    "evidence_frame": frame_no,
-                }
-            )
-            events.append(
-                TimelineEvent(
-                    ts=ts,
-                    session_id=session_id,
-                    kind="http_request",
-                    summary=summary,
-                    evidence_frame=frame_no,
+            http_method_b = http_request_method.strip()
+            http_host_b = http_host_raw.strip()
+            http_uri_b = http_request_uri.strip()
+            if http_method_b and (http_host_b or http_uri_b):
+                http_method = intern(http_method_b.decode("utf-8", "replace"))
+                http_host = intern(http_host_b.decode("utf-8", "replace"))
+                http_uri = http_uri_b.decode("utf-8", "replace")
+                summary = f"HTTP request: {http_method} {http_host}{http_uri}"
+                http_total[sid] += 1
+                session_obs = http_obs[sid]
+                if len(session_obs) < obs_limit:
+                    session_obs.append(
+                        {
+                            "method": http_method,
+                            "host": http_host or None,
+                            "uri": http_uri or None,
+                            "ts": ts,
+                            "evidence_frame": frame_no,
+                        }
+                    )
+                events_append((ts, frame_no, "http_request", session_ids[sid], summary))
+
+            sni = tls_server_name.strip()
+            if sni:
+                server_name = intern(sni.decode("utf-8", "replace"))
+                sni_total[sid] += 1
+                session_obs = sni_obs[sid]
+                if len(session_obs) < obs_limit:
+                    session_obs.append(
+                        {"server_name": server_name, "ts": ts, "evidence_frame": frame_no}
+                    )
+                events_append(
+                    (ts, frame_no, "tls_sni", session_ids[sid], f"TLS SNI: {server_name}")
                 )
+        if not chunk:
+            break
+
+    stderr = proc.stderr.read().decode("utf-8", "replace")
+    rc = proc.wait()
+    if rc != 0:
+        raise RuntimeError(f"tshark failed (exit {rc}): {stderr.strip()}")
+
+    table.packet_count = packet_count
+    table.first_ts = first_ts
+    table.last_ts = last_ts
+    return table
+
+
+def _merge_tables(
+    merged: _SessionTable,
+    table: _SessionTable,
+    *,
+    sample_frames_per_session: int,
+    max_observations_per_kind: Optional[int],
+) -> _SessionTable:
+    obs_limit = sys.maxsize if max_observations_per_kind is None else max_observations_per_kind
+    merged.packet_count += table.packet_count
+    if table.first_ts is not None:
+        if merged.first_ts is None or table.first_ts < merged.first_ts:
+            merged.first_ts = table.first_ts
+    if table.last_ts is not None:
+        if merged.last_ts is None or table.last_ts > merged.last_ts:
+            merged.last_ts = table.last_ts
+
+    chain_ids = {name: cid for cid, name in enumerate(merged.chain_names)}
+    chain_remap: list[int] = []
+    for name in table.chain_names:
+        cid = chain_ids.get(name)
+        if cid is None:
+            cid = chain_ids[name] = len(merged.chain_names)
+            merged.chain_names.append(name)
+        chain_remap.append(cid)
+
+    for session_key, src in table.session_index.items():
+        dst = merged.session_index.get(session_key)
+        if dst is None:
+            # Timestamp and frame bounds are widened to the shard's below.
+            dst = merged._new_session(
+                session_key,
+                table.session_ids[src],
+                table.transports[src],
+                table.endpoints_a[src],
+                table.endpoints_b[src],
+                table.first_ts_arr[src],
+                table.first_fr[src],
             )
 
-        sni = (row.get("tls.handshake.extensions_server_name") or "").strip()
-        if sni:
-            session["observations"]["tls_sni"].append(
-                {"server_name": sni, "ts": ts, "evidence_frame": frame_no}
+        merged.pkt_cnt[dst] += table.pkt_cnt[src]
+        merged.byte_cnt[dst] += table.byte_cnt[src]
+        if table.first_ts_arr[src] < merged.first_ts_arr[dst]:
+            merged.first_ts_arr[dst] = table.first_ts_arr[src]
+        if table.last_ts_arr[src] > merged.last_ts_arr[dst]:
+            merged.last_ts_arr[dst] = table.last_ts_arr[src]
+        if table.first_fr[src] < merged.first_fr[dst]:
+            merged.first_fr[dst] = table.first_fr[src]
+        if table.last_fr[src] > merged.last_fr[dst]:
+            merged.last_fr[dst] = table.last_fr[src]
+        samples = merged.sample_frames[dst]
+        samples.extend(table.sample_frames[src][: sample_frames_per_session - len(samples)])
+
+        counts = merged.chain_counts[dst]
+        for cid, n in enumerate(table.chain_counts[src]):
+            if n:
+                cid = chain_remap[cid]
+                if cid >= len(counts):
+                    counts.extend([0] * (cid + 1 - len(counts)))
+                counts[cid] += n
+
+        for merged_obs, table_obs in (
+            (merged.dns_obs[dst], table.dns_obs[src]),
+            (merged.http_obs[dst], table.http_obs[src]),
+            (merged.sni_obs[dst], table.sni_obs[src]),
+        ):
+            merged_obs.extend(table_obs[: obs_limit - len(merged_obs)])
+        merged.dns_total[dst] += table.dns_total[src]
+        merged.http_total[dst] += table.http_total[src]
+        merged.sni_total[dst] += table.sni_total[src]
+
+    merged.events.extend(table.events)
+    return merged
+
+
+def _scan_capture_sharded(
+    tshark_bin: str,
+    pcap_path: str,
+    *,
+    jobs: int,
+    sample_frames_per_session: int,
+    max_observations_per_kind: Optional[int],
+) -> _SessionTable:
+    # Split the capture into fixed-size shards with editcap and decode them
+    # with parallel tshark workers. Shard k holds frames
+    # k * _SHARD_PACKETS + 1 .. (k + 1) * _SHARD_PACKETS, so per-shard frame
+    # numbers are shifted back to their position in the original capture.
+    editcap_bin = _resolve_editcap(tshark_bin)
+    with tempfile.TemporaryDirectory(prefix="kisame-shards-") as shard_dir:
+        ext = os.path.splitext(pcap_path)[1] or ".pcapng"
+        proc = subprocess.run(
+            [
+                editcap_bin,
+                "-c",
+                str(_SHARD_PACKETS),
+                pcap_path,
+                os.path.join(shard_dir, "shard" + ext),
+            ],
+            check=False,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(
+                f"editcap failed (exit {proc.returncode}): {proc.stderr.strip()}"
             )
-            events.append(
-                TimelineEvent(
-                    ts=ts,
-                    session_id=session_id,
-                    kind="tls_sni",
-                    summary=f"TLS SNI: {sni}",
-                    evidence_frame=frame_no,
+        # editcap names shards <prefix>_<00000-based index>_<timestamp><ext>.
+        shard_paths = [os.path.join(shard_dir, name) for name in sorted(os.listdir(shard_dir))]
+
+        merged = _SessionTable()
+        # Spawn rather than fork: the SHA-256 thread may already be running,
+        # and forking a multi-threaded process can deadlock the children.
+        with ProcessPoolExecutor(
+            max_workers=jobs, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            futures = [
+                pool.submit(
+                    _scan_capture,
+                    tshark_bin,
+                    shard_path,
+                    max_packets=None,
+                    sample_frames_per_session=sample_frames_per_session,
+                    max_observations_per_kind=max_observations_per_kind,
+                    frame_offset=k * _SHARD_PACKETS,
                 )
-            )
+                for k, shard_path in enumerate(shard_paths)
+            ]
+            for future in futures:
+                merged = _merge_tables(
+                    merged,
+                    future.result(),
+                    sample_frames_per_session=sample_frames_per_session,
+                    max_observations_per_kind=max_observations_per_kind,
+                )
+    return merged
 
-    stderr = proc.stderr.read()
-    rc = proc.wait()
-    if rc != 0:
-        raise RuntimeError(f"tshark failed (exit {rc}): {stderr.strip()}")
 
-    session_list = list(sessions.values())
-    for s in session_list:
-        duration = float(s["last_ts"] - s["first_ts"])
-        flags: list[str] = []
-        if s["packet_count"] >= 1000:
-            flags.append("many_packets")
-        if duration >= 60:
-            flags.append("long_duration")
-        if s["byte_count"] >= 10 * 1024 * 1024:
-            flags.append("large_bytes")
-        if s["transport"] == "other":
-            flags.append("non_tcp_udp")
-        s["duration_seconds"] = duration
-        s["rule_flags"] = flags
-
-    timeline = sorted(events, key=lambda e: e.ts)
+def _analyze_pcap_streaming(
+    pcap_path: str,
+    *,
+    tshark_path: Optional[str],
+    max_packets: Optional[int],
+    sample_frames_per_session: int,
+    include_sha256: bool,
+    max_observations_per_kind: Optional[int] = None,
+    jobs: int = 1,
+) -> dict[str, Any]:
+    """Like analyze_pcap, but "sessions" and "timeline" are single-use iterators."""
+    if not os.path.isfile(pcap_path):
+        raise FileNotFoundError(f"PCAP not found: {pcap_path}")
+
+    tshark_bin = _resolve_tshark(tshark_path)
+
+    # Hash the capture while tshark is decoding it so the two passes over the
+    # file overlap instead of running back to back.
+    sha256_result: list[Any] = []
+
+    def _hash_capture() -> None:
+        try:
+            sha256_result.append(_sha256_file(pcap_path))
+        except BaseException as e:
+            sha256_result.append(e)
+
+    sha256_thread: Optional[threading.Thread] = None
+    if include_sha256:
+        sha256_thread = threading.Thread(target=_hash_capture, daemon=True)
+        sha256_thread.start()
+
+    if jobs > 1 and max_packets is None:
+        table = _scan_capture_sharded(
+            tshark_bin,
+            pcap_path,
+            jobs=jobs,
+            sample_frames_per_session=sample_frames_per_session,
+            max_observations_per_kind=max_observations_per_kind,
+        )
+    else:
+        table = _scan_capture(
+            tshark_bin,
+            pcap_path,
+            max_packets=max_packets,
+            sample_frames_per_session=sample_frames_per_session,
+            max_observations_per_kind=max_observations_per_kind,
+        )
+
+    sha256: Optional[str] = None
+    if sha256_thread is not None:
+        sha256_thread.join()
+        if isinstance(sha256_result[0], BaseException):
+            raise sha256_result[0]
+        sha256 = sha256_result[0]
+
+    session_ids = table.session_ids
+    transports = table.transports
+    endpoints_a = table.endpoints_a
+    endpoints_b = table.endpoints_b
+    first_ts_arr = table.first_ts_arr
+    last_ts_arr = table.last_ts_arr
+    pkt_cnt = table.pkt_cnt
+    byte_cnt = table.byte_cnt
+    first_fr = table.first_fr
+    last_fr = table.last_fr
+    sample_frames = table.sample_frames
+    chain_names = table.chain_names
+    chain_counts = table.chain_counts
+    dns_obs = table.dns_obs
+    http_obs = table.http_obs
+    sni_obs = table.sni_obs
+    dns_total = table.dns_total
+    http_total = table.http_total
+    sni_total = table.sni_total
+    events = table.events
+
+    # Sessions and timeline entries are produced lazily so the artifact can be
+    # written one item at a time (see _write_artifact) instead of holding the
+    # fully built JSON structure in memory alongside the session arrays.
+    # Totals only differ from the list lengths when the lists are capped.
+    report_observation_counts = max_observations_per_kind is not None
+
+    def _iter_sessions() -> Iterator[dict[str, Any]]:
+        order = sorted(
+            range(len(session_ids)), key=lambda i: (first_ts_arr[i], session_ids[i])
+        )
+        for sid in order:
+            duration = float(last_ts_arr[sid] - first_ts_arr[sid])
+            flags: list[str] = []
+            if pkt_cnt[sid] >= 1000:
+                flags.append("many_packets")
+            if duration >= 60:
+                flags.append("long_duration")
+            if byte_cnt[sid] >= 10 * 1024 * 1024:
+                flags.append("large_bytes")
+            if transports[sid] == "other":
+                flags.append("non_tcp_udp")
+            session: dict[str, Any] = {
+                "id": session_ids[sid],
+                "transport": transports[sid],
+                "endpoints": {"a": endpoints_a[sid], "b": endpoints_b[sid]},
+                "first_ts": first_ts_arr[sid],
+                "last_ts": last_ts_arr[sid],
+                "packet_count": pkt_cnt[sid],
+                "byte_count": byte_cnt[sid],
+                "protocol_chains": {
+                    chain_names[cid]: n for cid, n in enumerate(chain_counts[sid]) if n
+                },
+                "evidence": {
+                    "first_frame": first_fr[sid],
+                    "last_frame": last_fr[sid],
+                    "sample_frames": sample_frames[sid],
+                },
+                "observations": {
+                    "dns_queries": dns_obs[sid],
+                    "http_requests": http_obs[sid],
+                    "tls_sni": sni_obs[sid],
+                },
+            }
+            if report_observation_counts:
+                session["observation_counts"] = {
+                    "dns_queries": dns_total[sid],
+                    "http_requests": http_total[sid],
+                    "tls_sni": sni_total[sid],
+                }
+            session["rule_flags"] = flags
+            session["duration_seconds"] = duration
+            yield session
+
+    def _iter_timeline() -> Iterator[dict[str, Any]]:
+        for ts, evidence_frame, kind, session_id, summary in events:
+            yield {
+                "ts": ts,
+                "session_id": session_id,
+                "kind": kind,
+                "summary": summary,
+                "evidence_frame": evidence_frame,
+            }
+
+    events.sort()
 
     pcap_stat = os.stat(pcap_path)
     artifact: dict[str, Any] = {
@@ -349,47 +842,84 @@ def analyze_pcap(
             "path": os.path.abspath(pcap_path),
             "file_name": os.path.basename(pcap_path),
             "size_bytes": int(pcap_stat.st_size),
-            "sha256": _sha256_file(pcap_path) if include_sha256 else None,
-            "packets_analyzed": packet_count,
-            "first_ts": first_ts,
-            "last_ts": last_ts,
+            "sha256": sha256,
+            "packets_analyzed": table.packet_count,
+            "first_ts": table.first_ts,
+            "last_ts": table.last_ts,
         },
         "tooling": {
             "tshark_path": tshark_bin,
             "tshark_version": _tshark_version(tshark_bin),
         },
-        "sessions": sorted(session_list, key=lambda s: (s["first_ts"], s["id"])),
-        "timeline": [
-            {
-                "ts": e.ts,
-                "session_id": e.session_id,
-                "kind": e.kind,
-                "summary": e.summary,
-                "evidence_frame": e.evidence_frame,
-            }
-            for e in timeline
-        ],
+        "sessions": _iter_sessions(),
+        "timeline": _iter_timeline(),
     }
     return artifact
 
 
+def analyze_pcap(
+    pcap_path: str,
+    *,
+    tshark_path: Optional[str],
+    max_packets: Optional[int],
+    sample_frames_per_session: int,
+    include_sha256: bool,
+    max_observations_per_kind: Optional[int] = None,
+    jobs: int = 1,
+) -> dict[str, Any]:
+    artifact = _analyze_pcap_streaming(
+        pcap_path,
+        tshark_path=tshark_path,
+        max_packets=max_packets,
+        sample_frames_per_session=sample_frames_per_session,
+        include_sha256=include_sha256,
+        max_observations_per_kind=max_observations_per_kind,
+        jobs=jobs,
+    )
+    artifact["sessions"] = list(artifact["sessions"])
+    artifact["timeline"] = list(artifact["timeline"])
+    return artifact
+
+
+def _int_at_least(value: str, minimum: int) -> int:
+    try:
+        n = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}") from None
+    if n < minimum:
+        raise argparse.ArgumentTypeError(f"must be at least {minimum}, got {n}")
+    return n
+
+
+def _positive_int(value: str) -> int:
+    return _int_at_least(value, 1)
+
+
+def _non_negative_int(value: str) -> int:
+    return _int_at_least(value, 0)
+
+
 def _cmd_analyze(args: argparse.Namespace) -> int:
-    artifact = analyze_pcap(
+    if args.jobs > 1 and args.max_packets is not None:
+        print(
+            "warning: --jobs is ignored with --max-packets; decoding in a single process",
+            file=sys.stderr,
+        )
+    artifact = _analyze_pcap_streaming(
         args.pcap,
         tshark_path=args.tshark,
         max_packets=args.max_packets,
         sample_frames_per_session=args.sample_frames_per_session,
         include_sha256=not args.skip_hash,
+        max_observations_per_kind=args.max_observations_per_kind,
+        jobs=args.jobs,
     )
-    encoded = json.dumps(artifact, indent=2, sort_keys=False)
     if args.output:
         os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
-        with open(args.output, "w", encoding="utf-8") as f:
-            f.write(encoded)
-            f.write("\n")
+        with open(args.output, "wb") as f:
+            _write_artifact(f, artifact)
     else:
-        sys.stdout.write(encoded)
-        sys.stdout.write("\n")
+        _write_artifact(sys.stdout.buffer, artifact)
     return 0
 
 
@@ -424,11 +954,25 @@ def main(argv: Optional[list[str]] = None) -> int:
         default=8,
         help="How many frame numbers to keep as evidence samples per session",
     )
+    analyze.add_argument(
+        "--max-observations-per-kind",
+        type=_non_negative_int,
+        default=None,
+        help="Keep at most this many DNS/HTTP/TLS observations per session and kind "
+        "(totals are still reported in observation_counts)",
+    )
     analyze.add_argument(
         "--skip-hash",
         action="store_true",
         help="Skip SHA-256 (faster for very large captures)",
     )
+    analyze.add_argument(
+        "--jobs",
+        type=_positive_int,
+        default=1,
+        help="Decode with this many parallel tshark workers (splits the capture with editcap; "
+        "ignored with --max-packets)",
+    )
     analyze.set_defaults(func=_cmd_analyze)
 
     args = parser.parse_args(argv)